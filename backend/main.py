@@ -2,21 +2,19 @@
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
-import time
+import asyncio
+import orjson
+import uuid
 import os
 
 from src.prompts import get_prompts, set_prompts
-from restack_ai import Restack
-from restack_ai.restack import CloudConnectionOptions
+from src.client import get_client
 
-RESTACK_ENGINE_ADDRESS = os.getenv('RESTACK_ENGINE_ADDRESS')
-RESTACK_TEMPORAL_ADDRESS = os.getenv('RESTACK_TEMPORAL_ADDRESS')
-RESTACK_ENGINE_ID = os.getenv('RESTACK_ENGINE_ID')
-RESTACK_ENGINE_API_KEY = os.getenv('RESTACK_ENGINE_API_KEY')
+WORKFLOW_STATUS_MAX_WAIT_SECONDS = float(os.getenv("WORKFLOW_STATUS_MAX_WAIT_SECONDS", "25"))
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # CORS configuration
 app.add_middleware(
@@ -30,6 +28,7 @@ app.add_middleware(
 class UserInput(BaseModel):
     user_prompt: str
     test_conditions: str
+    cache: bool = True
 
 class PromptsInput(BaseModel):
     generate_code_prompt: str
@@ -44,35 +43,45 @@ def update_prompts(prompts: PromptsInput):
     set_prompts(prompts.generate_code_prompt, prompts.validate_output_prompt)
     return {"status": "updated"}
 
+# The 500 body never changes, so serialize it once instead of per error.
+INTERNAL_ERROR_BODY = orjson.dumps({"error": "Internal Server Error."})
+INTERNAL_ERROR_HEADERS = {"Access-Control-Allow-Origin": "http://localhost:8080"}
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
+    return Response(
+        content=INTERNAL_ERROR_BODY,
         status_code=500,
-        content={"error": "Internal Server Error."},
-        headers={"Access-Control-Allow-Origin": "http://localhost:8080"},
+        media_type="application/json",
+        headers=INTERNAL_ERROR_HEADERS,
     )
 
 @app.post("/run_workflow")
 async def run_workflow(params: UserInput):
-    connection_options = CloudConnectionOptions(
-    engine_id=RESTACK_ENGINE_ID,
-    api_key=RESTACK_ENGINE_API_KEY,
-    address=RESTACK_TEMPORAL_ADDRESS,
-    api_address=RESTACK_ENGINE_ADDRESS,
-    temporal_namespace="default")
-
-    # Initialize Restack with these options options=connection_options
-    client = Restack(connection_options)
     try:
-        workflow_id = f"{int(time.time() * 1000)}-AutonomousCodingWorkflow"
-        runId = await client.schedule_workflow(
+        workflow_id = f"{uuid.uuid4().hex}-AutonomousCodingWorkflow"
+        runId = await get_client().schedule_workflow(
             workflow_name="AutonomousCodingWorkflow",
             workflow_id=workflow_id,
             input=params.dict()
         )
-        result = await client.get_workflow_result(workflow_id=workflow_id, run_id=runId)
-        return {"workflow_id": workflow_id, "result": result}
+        return {"workflow_id": workflow_id, "run_id": runId}
     except Exception as e:
-        # If engine connection or workflow run fails, a 500 error is raised
+        # If engine connection fails, a 500 error is raised
         # The global_exception_handler ensures CORS headers are included.
-        raise HTTPException(status_code=500, detail="Failed to connect to Restack engine or run workflow.")
+        raise HTTPException(status_code=500, detail="Failed to connect to Restack engine or schedule workflow.")
+
+@app.get("/workflow_status/{workflow_id}")
+async def workflow_status(workflow_id: str, run_id: str):
+    # Long-poll: wait up to WORKFLOW_STATUS_MAX_WAIT_SECONDS for the result,
+    # otherwise report "running" so the client can poll again.
+    try:
+        result = await asyncio.wait_for(
+            get_client().get_workflow_result(workflow_id=workflow_id, run_id=run_id),
+            timeout=WORKFLOW_STATUS_MAX_WAIT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        return {"workflow_id": workflow_id, "status": "running"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Failed to connect to Restack engine or fetch workflow result.")
+    return {"workflow_id": workflow_id, "status": "completed", "result": result}
@@ -1,10 +1,10 @@
 # backend/schedule_workflow.py
 #DEP
 import asyncio
-import time
+import uuid
 from restack_ai import Restack
 from dataclasses import dataclass
-from src.client import client
+from src.client import get_client
 
 @dataclass
 class InputParams:
@@ -13,8 +13,8 @@ class InputParams:
 
 async def main():
 
-    workflow_id = f"{int(time.time() * 1000)}-AutonomousCodingWorkflow"
-    runId = await client.schedule_workflow(
+    workflow_id = f"{uuid.uuid4().hex}-AutonomousCodingWorkflow"
+    runId = await get_client().schedule_workflow(
         workflow_name="AutonomousCodingWorkflow",
         workflow_id=workflow_id,
         input=InputParams(
@@ -23,7 +23,7 @@ async def main():
         )
     )
 
-    result = await client.get_workflow_result(
+    result = await get_client().get_workflow_result(
         workflow_id=workflow_id,
         run_id=runId
     )
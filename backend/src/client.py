@@ -1,5 +1,6 @@
 #./backend/src/client.py
 import os 
+from functools import cache
 from restack_ai import Restack
 from restack_ai.restack import CloudConnectionOptions
 
@@ -16,5 +17,8 @@ connection_options = CloudConnectionOptions(
     api_address=RESTACK_ENGINE_ADDRESS,
     temporal_namespace="default")
 
-# Initialize Restack with these options options=connection_options
-client = Restack(connection_options)
\ No newline at end of file
+# Built on first use and shared by every caller in the process, so the
+# underlying engine connection is opened once and reused.
+@cache
+def get_client() -> Restack:
+    return Restack(connection_options)
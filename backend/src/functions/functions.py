@@ -2,116 +2,95 @@
 from restack_ai.function import function, log
 from dataclasses import dataclass
 import os
+import asyncio
 import openai
-import json
+import httpx
+import orjson
+import hashlib
 import shutil
-import subprocess
-from datetime import datetime
+import time
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
+from src import llm_cache
 from src.prompts import current_generate_code_prompt, current_validate_output_prompt
 
 openai.api_key = os.environ.get("OPENAI_KEY")
 
-# Use the OpenAI Python SDK's structured output parsing
-from openai import OpenAI
-client = OpenAI(api_key=openai.api_key)
+# Where generated projects are written; resolved once at import time.
+# Outside the container /app/output usually doesn't exist, so fall back to
+# the repo-local llm-output folder instead of failing on every run.
+LLM_OUTPUT_DIR = os.environ.get("LLM_OUTPUT_DIR") or (
+    "/app/output" if os.path.isdir("/app/output") else "./llm-output"
+)
+
+# Build with BuildKit so unchanged layers are reused from the daemon's
+# build cache across runs (the docker-dind daemon is long-lived).
+DOCKER_BUILD_ENV = {**os.environ, "DOCKER_BUILDKIT": "1"}
+
+# Keep inspect + build + run + cleanup (15 + 180 + 60 + 15s by default) inside
+# the activity's 300s start_to_close_timeout so a hung step is reported back
+# to the validator instead of killing the activity.
+DOCKER_BUILD_TIMEOUT = float(os.environ.get("DOCKER_BUILD_TIMEOUT", "180"))
+DOCKER_RUN_TIMEOUT = float(os.environ.get("DOCKER_RUN_TIMEOUT", "60"))
+DOCKER_INSPECT_TIMEOUT = float(os.environ.get("DOCKER_INSPECT_TIMEOUT", "15"))
+DOCKER_CLEANUP_TIMEOUT = float(os.environ.get("DOCKER_CLEANUP_TIMEOUT", "15"))
+
+# Cap in-flight LLM calls per worker to stay within rate limits; the SDK
+# already retries 429s with backoff honouring retry-after.
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8"))
+openai_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+# The system message and prompt instructions are a static prefix (the
+# per-request values come last, see src/prompts.py). A stable
+# prompt_cache_key per activity routes those calls to the same prompt cache.
+# Passed via extra_body since the pinned SDK predates the named parameter.
+GENERATE_CODE_PROMPT_CACHE_KEY = "azlon-generate-code"
+VALIDATE_OUTPUT_PROMPT_CACHE_KEY = "azlon-validate-output"
+
+# Use the OpenAI Python SDK's structured output parsing. One shared HTTP pool
+# sized to the semaphore; idle connections are kept long enough to survive the
+# docker build/run between iterations so each call skips the TLS handshake.
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+client = AsyncOpenAI(
+    api_key=openai.api_key,
+    max_retries=2,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONCURRENCY,
+            max_keepalive_connections=OPENAI_MAX_CONCURRENCY,
+            keepalive_expiry=300
+        ),
+        timeout=httpx.Timeout(connect=5.0, read=240.0, write=30.0, pool=30.0)
+    )
+)
 
 class FileItem(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     filename: str
     content: str
 
-    class Config:
-        extra = "forbid"
-        schema_extra = {
-            "type": "object",
-            "properties": {
-                "filename": {"type": "string"},
-                "content": {"type": "string"}
-            },
-            "required": ["filename", "content"],
-            "additionalProperties": False
-        }
-
 class GenerateCodeSchema(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     dockerfile: str
     files: List[FileItem]
-    
-    class Config:
-        extra = "forbid"
-        schema_extra = {
-            "type": "object",
-            "properties": {
-                "dockerfile": {"type": "string"},
-                "files": {
-                    "type": "array",
-                    "items": {"$ref": "#/$defs/FileItem"}
-                }
-            },
-            "required": ["dockerfile", "files"],
-            "additionalProperties": False,
-            "$defs": {
-                "FileItem": {
-                    "type": "object",
-                    "properties": {
-                        "filename": {"type": "string"},
-                        "content": {"type": "string"}
-                    },
-                    "required": ["filename", "content"],
-                    "additionalProperties": False
-                }
-            }
-        }
 
 class ValidateOutputSchema(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     result: bool
     dockerfile: Optional[str] = None
     files: Optional[List[FileItem]] = None
-    
-    class Config:
-        extra = "forbid"
-        schema_extra = {
-            "type": "object",
-            "properties": {
-                "result": {"type": "boolean"},
-                "dockerfile": {
-                    "anyOf": [
-                        {"type": "string"},
-                        {"type": "null"}
-                    ]
-                },
-                "files": {
-                    "anyOf": [
-                        {
-                            "type": "array",
-                            "items": {"$ref": "#/$defs/FileItem"}
-                        },
-                        {"type": "null"}
-                    ]
-                }
-            },
-            "required": ["result", "dockerfile", "files"],
-            "additionalProperties": False,
-            "$defs": {
-                "FileItem": {
-                    "type": "object",
-                    "properties": {
-                        "filename": {"type": "string"},
-                        "content": {"type": "string"}
-                    },
-                    "required": ["filename", "content"],
-                    "additionalProperties": False
-                }
-            }
-        }
 
 
 @dataclass
 class GenerateCodeInput:
     user_prompt: str
     test_conditions: str
+    cache: bool = True
 
 @dataclass
 class GenerateCodeOutput:
@@ -127,19 +106,32 @@ async def generate_code(input: GenerateCodeInput) -> GenerateCodeOutput:
         test_conditions=input.test_conditions
     )
 
-    completion = client.beta.chat.completions.parse(
-        model="gpt-4o-2024-08-06",
-        messages=[
-            {"role": "system", "content": "You are the initial of an autonomous coding assistant agent. Generate complete code that will run."},
-            {"role": "user", "content": prompt}
-        ],
-        response_format=GenerateCodeSchema
-    )
+    model = "gpt-4o-2024-08-06"
+    messages = [
+        {"role": "system", "content": "You are the initial of an autonomous coding assistant agent. Generate complete code that will run."},
+        {"role": "user", "content": prompt}
+    ]
 
-    result = completion.choices[0].message
-    if result.refusal:
-        raise RuntimeError("Model refused to generate code.")
-    data = result.parsed
+    cache_key = llm_cache.make_key(model, messages)
+    cached = llm_cache.get(cache_key) if input.cache else None
+    if cached is not None:
+        data, total_tokens = cached
+        log.info(f"generate_code cache hit, tokens saved: {total_tokens}")
+    else:
+        log.info("generate_code cache miss" if input.cache else "generate_code cache bypassed")
+        async with openai_semaphore:
+            completion = await client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=GenerateCodeSchema,
+                extra_body={"prompt_cache_key": GENERATE_CODE_PROMPT_CACHE_KEY}
+            )
+
+        result = completion.choices[0].message
+        if result.refusal:
+            raise RuntimeError("Model refused to generate code.")
+        data = result.parsed
+        llm_cache.put(cache_key, (data, completion.usage.total_tokens if completion.usage else 0))
 
     files_list = [{"filename": f.filename, "content": f.content} for f in data.files]
 
@@ -155,44 +147,104 @@ class RunCodeInput:
 class RunCodeOutput:
     output: str
 
+def write_file(path: str, content: str) -> None:
+    # Encode once and write raw bytes, skipping the TextIOWrapper layer
+    data = memoryview(content.encode("utf-8"))
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+async def run_command(cmd: list, timeout: float, env: Optional[dict] = None):
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=env
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except BaseException:
+        # Timeouts and activity cancellation alike: don't orphan the child
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    return proc.returncode, stdout.decode("utf-8", errors="replace"), stderr.decode("utf-8", errors="replace")
+
+async def remove_container(container_name: str) -> None:
+    try:
+        await run_command(["docker", "rm", "-f", container_name], DOCKER_CLEANUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        log.warning(f"Timed out removing container {container_name}")
+
 @function.defn()
 async def run_locally(input: RunCodeInput) -> RunCodeOutput:
     log.info("run_locally started", input=input)
     
-    # Decide where to put the files. If not set, fall back to /tmp or /app/output
-    base_output_dir = os.environ.get("LLM_OUTPUT_DIR", "/app/output")
+    # For clarity, create a unique subfolder each run (nanosecond timestamp,
+    # so concurrent runs started in the same second don't share a folder):
+    run_id = f"{time.time_ns():x}"
+    run_folder = os.path.join(LLM_OUTPUT_DIR, f"llm_run_{run_id}")
+    
+    # Collect the Dockerfile and each file by normalized path, so aliases such
+    # as "app.py" and "./app.py" share one entry; later entries win, as they
+    # did when the files were written one after another.
+    contents = {os.path.normpath(os.path.join(run_folder, "Dockerfile")): input.dockerfile}
+    for file_item in input.files:
+        file_path = os.path.normpath(os.path.join(run_folder, file_item["filename"]))
+        contents[file_path] = file_item["content"]
+        log.info(f"Writing file {file_item['filename']} to {file_path}")
     
-    # For clarity, create a unique subfolder each run (timestamp-based):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    run_folder = os.path.join(base_output_dir, f"llm_run_{timestamp}")
-    os.makedirs(run_folder, exist_ok=True)
+    # Create each distinct directory once (parents first) rather than once per file
+    for dir_path in sorted({os.path.dirname(path) for path in contents}, key=len):
+        os.makedirs(dir_path, exist_ok=True)
     
-    # Write the Dockerfile
-    dockerfile_path = os.path.join(run_folder, "Dockerfile")
-    with open(dockerfile_path, "w", encoding="utf-8") as f:
-        f.write(input.dockerfile)
+    # Write them concurrently in worker threads to keep the event loop free
+    await asyncio.gather(*(
+        asyncio.to_thread(write_file, path, content) for path, content in contents.items()
+    ))
     
-    # Write each file
-    for file_item in input.files:
-        file_path = os.path.join(run_folder, file_item["filename"])
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "w", encoding="utf-8") as ff:
-            ff.write(file_item["content"])
-            log.info(f"Writing file {file_item['filename']} to {file_path}")
+    # Tag the image with a digest of the build context. Repair iterations that
+    # leave the Dockerfile and files untouched reuse the image without a build.
+    digest = hashlib.blake2b(digest_size=12)
+    for path, content in sorted(contents.items()):
+        digest.update(os.path.relpath(path, run_folder).encode("utf-8") + b"\0")
+        digest.update(content.encode("utf-8") + b"\0")
+    image_tag = f"myapp:{digest.hexdigest()}"
     
     # Now run docker build, connecting to Docker-in-Docker at DOCKER_HOST
-    build_cmd = ["docker", "build", "-t", "myapp", run_folder]
-    build_process = subprocess.run(build_cmd, capture_output=True, text=True)
-    if build_process.returncode != 0:
-        return RunCodeOutput(output=build_process.stderr or build_process.stdout)
+    build_cmd = ["docker", "build", "--progress=plain", "-t", image_tag, run_folder]
+    try:
+        returncode, _, _ = await run_command(["docker", "image", "inspect", image_tag], DOCKER_INSPECT_TIMEOUT)
+    except asyncio.TimeoutError:
+        # Treat a slow lookup as "not found" and build
+        returncode = 1
+    if returncode == 0:
+        log.info(f"Reusing existing image {image_tag}")
+    else:
+        try:
+            returncode, stdout, stderr = await run_command(build_cmd, DOCKER_BUILD_TIMEOUT, env=DOCKER_BUILD_ENV)
+        except asyncio.TimeoutError:
+            return RunCodeOutput(output=f"docker build timed out after {DOCKER_BUILD_TIMEOUT:g} seconds")
+        if returncode != 0:
+            return RunCodeOutput(output=stderr or stdout)
     
-    # Then run the container
-    run_cmd = ["docker", "run", "--rm", "myapp"]
-    run_process = subprocess.run(run_cmd, capture_output=True, text=True)
-    if run_process.returncode != 0:
-        return RunCodeOutput(output=run_process.stderr or run_process.stdout)
+    # Then run the container. It is named so it can be removed on timeout or
+    # cancellation: killing the docker CLI alone leaves the container running.
+    container_name = f"myapp-{run_id}"
+    run_cmd = ["docker", "run", "--rm", "--name", container_name, image_tag]
+    try:
+        returncode, stdout, stderr = await run_command(run_cmd, DOCKER_RUN_TIMEOUT)
+    except asyncio.TimeoutError:
+        await remove_container(container_name)
+        return RunCodeOutput(output=f"docker run timed out after {DOCKER_RUN_TIMEOUT:g} seconds")
+    except asyncio.CancelledError:
+        await asyncio.shield(remove_container(container_name))
+        raise
+    if returncode != 0:
+        return RunCodeOutput(output=stderr or stdout)
     
-    return RunCodeOutput(output=run_process.stdout)
+    return RunCodeOutput(output=stdout)
 
 
 @dataclass
@@ -212,7 +264,8 @@ class ValidateOutputOutput:
 async def validate_output(input: ValidateOutputInput) -> ValidateOutputOutput:
     log.info("validate_output started", input=input)
 
-    files_str = json.dumps(input.files, indent=2)
+    # Compact JSON: indentation only adds input tokens
+    files_str = orjson.dumps(input.files).decode("utf-8")
 
     validation_prompt = current_validate_output_prompt.format(
         test_conditions=input.test_conditions,
@@ -221,14 +274,17 @@ async def validate_output(input: ValidateOutputInput) -> ValidateOutputOutput:
         output=input.output
     )
 
-    completion = client.beta.chat.completions.parse(
-        model="gpt-4o-2024-08-06",
-        messages=[
-            {"role": "system", "content": "You are an iteration of an autonomous coding assistant agent. If you change any files, provide complete file content replacements. Append a brief explanation at the bottom of readme.md about what you tried."},
-            {"role": "user", "content": validation_prompt}
-        ],
-        response_format=ValidateOutputSchema
-    )
+    async with openai_semaphore:
+        completion = await client.beta.chat.completions.parse(
+            model="gpt-4o-2024-08-06",
+            messages=[
+                {"role": "system", "content": "You are an iteration of an autonomous coding assistant agent. If you change any files, provide complete file content replacements. Append a brief explanation at the bottom of readme.md about what you tried."},
+                {"role": "user", "content": validation_prompt}
+            ],
+            response_format=ValidateOutputSchema,
+            temperature=0.2,
+            extra_body={"prompt_cache_key": VALIDATE_OUTPUT_PROMPT_CACHE_KEY}
+        )
 
     result = completion.choices[0].message
     if result.refusal:
@@ -0,0 +1,26 @@
+# ./backend/src/llm_cache.py
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+# Exact-match cache of parsed LLM responses, keyed on the model and everything
+# sent to it. In-process and LRU-bounded by LLM_CACHE_SIZE.
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", "128"))
+_cache = OrderedDict()
+
+def make_key(model: str, messages: list) -> bytes:
+    payload = json.dumps([model, messages], separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+def get(key: bytes):
+    value = _cache.get(key)
+    if value is not None:
+        _cache.move_to_end(key)
+    return value
+
+def put(key: bytes, value) -> None:
+    _cache[key] = value
+    _cache.move_to_end(key)
+    while len(_cache) > LLM_CACHE_SIZE:
+        _cache.popitem(last=False)
@@ -1,11 +1,12 @@
 # ./backend/src/prompts.py
+from functools import lru_cache
 
-# Store defaults here
+# Store defaults here.
+# Per-request values ({user_prompt}, {dockerfile}, ...) sit at the end of each
+# template so the static instructions form a stable prefix that the
+# provider's prompt cache can reuse across calls.
 default_generate_code_prompt = """You are an autonomous coding agent.
 
-The user prompt: {user_prompt}
-The test conditions: {test_conditions}
-
 You must produce a Docker environment and code that meets the user's test conditions.
 
 **Additional Requirements**:
@@ -56,18 +57,12 @@ You must produce a Docker environment and code that meets the user's test condit
     }}
   ]
 }}
-"""
-
-default_validate_output_prompt = """The test conditions: {test_conditions}
-
-dockerfile:
-{dockerfile}
 
-files:
-{files_str}
+The user prompt: {user_prompt}
+The test conditions: {test_conditions}
+"""
 
-output:
-{output}
+default_validate_output_prompt = """Check whether the output below meets the test conditions.
 
 If all test conditions are met, return exactly:
 {{ "result": true, "dockerfile": null, "files": null }}
@@ -85,12 +80,24 @@ Otherwise (if you need to fix or add files, modify the dockerfile, etc.), return
 }}
 
 You may add, remove, or modify multiple files as needed when returning false. Just ensure you follow the same schema and format strictly. Do not add extra commentary or keys.
-If returning null for dockerfile or files, use JSON null, not a string."""
+If returning null for dockerfile or files, use JSON null, not a string.
+
+The test conditions: {test_conditions}
+
+dockerfile:
+{dockerfile}
+
+files:
+{files_str}
+
+output:
+{output}"""
 
 # Storing the current prompts in memory for simplicity.
 current_generate_code_prompt = default_generate_code_prompt
 current_validate_output_prompt = default_validate_output_prompt
 
+@lru_cache(maxsize=1)
 def get_prompts():
     return {
         "generate_code_prompt": current_generate_code_prompt,
@@ -101,3 +108,4 @@ def set_prompts(generate_code_prompt: str, validate_output_prompt: str):
     global current_generate_code_prompt, current_validate_output_prompt
     current_generate_code_prompt = generate_code_prompt
     current_validate_output_prompt = validate_output_prompt
+    get_prompts.cache_clear()
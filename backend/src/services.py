@@ -2,13 +2,13 @@
 import traceback
 import asyncio
 import time
-from src.client import client
+from src.client import get_client
 from src.functions.functions import generate_code, run_locally, validate_output
 from src.workflows.workflow import AutonomousCodingWorkflow
 
 async def main():
     try:
-        await client.start_service(
+        await get_client().start_service(
             workflows=[AutonomousCodingWorkflow],
             functions=[generate_code, run_locally, validate_output],
         )
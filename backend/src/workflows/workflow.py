@@ -12,6 +12,7 @@ with import_functions():
 class WorkflowInputParams:
     user_prompt: str
     test_conditions: str
+    cache: bool = True
 
 @workflow.defn()
 class AutonomousCodingWorkflow:
@@ -23,7 +24,8 @@ class AutonomousCodingWorkflow:
             generate_code,
             GenerateCodeInput(
                 user_prompt=input.user_prompt,
-                test_conditions=input.test_conditions
+                test_conditions=input.test_conditions,
+                cache=input.cache
             ),
             start_to_close_timeout=timedelta(seconds=300)
         )
@@ -68,9 +68,27 @@ const Index = () => {
         })
       });
 
-      const data = await response.json();
+      if (!response.ok) {
+        throw new Error(`Failed to schedule workflow: ${response.status}`);
+      }
+      const { workflow_id, run_id } = await response.json();
+      console.log("Workflow scheduled:", workflow_id);
+
+      // The status endpoint long-polls, so each request waits server-side
+      // until the workflow finishes or the poll window elapses.
+      let data;
+      do {
+        const statusResponse = await fetch(
+          `${API_URL}/workflow_status/${encodeURIComponent(workflow_id)}?run_id=${encodeURIComponent(run_id)}`
+        );
+        if (!statusResponse.ok) {
+          throw new Error(`Failed to fetch workflow status: ${statusResponse.status}`);
+        }
+        data = await statusResponse.json();
+      } while (data.status === "running");
+
       console.log("Workflow result:", data);
-      setResult(data);
+      setResult({ workflow_id: data.workflow_id, result: data.result });
       toast({
         title: "Success",
         description: "Workflow completed successfully.",